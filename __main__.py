@@ -1,15 +1,87 @@
-from typing import List, Tuple, Dict
-from dataclasses import dataclass
+from typing import List, Tuple, Dict, Optional, Iterable, Set, Union
+from dataclasses import dataclass, field
+from collections import deque
+from array import array
+import heapq
+import math
+import multiprocessing
+import multiprocessing.connection
+import random
 import sys
 import tkinter as tk
 from tkinter import messagebox
 
+try:
+    import numpy as np
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # без Numba працює чистий Python-пошук
+    HAVE_NUMBA = False
+
 # ======================= МОДЕЛЬ CSP =======================
 
+# Сітка зберігається як bytearray довжини h*w з кодами клітинок:
+#   0 – '#', 1 – '.', 2..27 – 'A'..'Z'
+WALL = 0
+EMPTY = 1
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+TO_CODES = bytes.maketrans(("#." + LETTERS).encode("ascii"), bytes(range(2 + len(LETTERS))))
+FROM_CODES = bytes.maketrans(bytes(range(2 + len(LETTERS))), ("#." + LETTERS).encode("ascii"))
+
+# Стратегії впорядкування для портфеля (solve_portfolio):
+# (усі вибирають слот за MRV, нічиї – за більшим степенем, тобто кількістю перетинів)
+#   mrv_lcv         – найменш обмежувальне слово першим (LCV)
+#   mrv_random      – випадковий порядок слів
+#   mrv_dict        – словниковий порядок слів
+#   random_restarts – перезапуски зі зростаючим лімітом вузлів, випадкові
+#                     залишкові нічиї MRV і випадковий порядок слів, зважений LCV-оцінкою
+STRATEGIES = ("mrv_lcv", "mrv_random", "mrv_dict", "random_restarts")
+# ліміт спроб першого перезапуску; далі подвоюється
+RESTART_FIRST_BUDGET = 256
+# з якої кількості слотів MRV-слот береться з купи (mrv_heap_select), а не
+# лінійним переглядом: на менших сітках накладні витрати купи більші за виграш
+MRV_HEAP_MIN_SLOTS = 32
+# у скільки разів MRV-купа може перерости кількість слотів, перш ніж її
+# перебудувати без застарілих записів (mrv_heap_select)
+MRV_HEAP_SLACK = 8
+# Скільки спроб mrv_lcv робить у Python, перш ніж передати пошук Numba-ядру.
+# Завантаження скомпільованого ядра з кешу коштує ~0.15 с (перша компіляція –
+# ~8-10 с), а 10000 спроб у Python – приблизно стільки ж, тож легкі сітки
+# розв’язуються без ядра, а ядро отримують лише довгі пошуки.
+NUMBA_AFTER_NODES = 10000
+
+
 @dataclass
 class Slot:
     id: int
     cells: List[Tuple[int, int]]  # список координат (row, col) для цього слова
+    cell_idx: array  # ті ж клітинки як індекси r*w+c у пласкій сітці
+    # перетини: (id_іншого, позиція_в_цьому, позиція_в_іншому), заповнює parse_grid
+    intersections: List[Tuple[int, int, int]] = field(default_factory=list)
+
+
+def encode_word(word: str) -> bytes:
+    """
+    Слово (A..Z) -> коди клітинок сітки.
+    """
+    return word.encode("ascii").translate(TO_CODES)
+
+
+def decode_word(codes: bytes) -> str:
+    """
+    Коди клітинок -> слово (A..Z).
+    """
+    return codes.translate(FROM_CODES).decode("ascii")
+
+
+def render_grid(grid: bytearray, w: int) -> List[str]:
+    """
+    Пласка сітка -> список рядків з символами '#', '.', 'A'..'Z'.
+    """
+    return [
+        grid[i:i + w].translate(FROM_CODES).decode("ascii")
+        for i in range(0, len(grid), w)
+    ]
 
 
 def parse_grid(raw: List[str]):
@@ -24,27 +96,36 @@ def parse_grid(raw: List[str]):
 
     h = len(raw)
     w = len(raw[0])
+    allowed = set("#." + LETTERS)
     for row in raw:
         if len(row) != w:
             raise ValueError("Усі рядки сітки мають бути однакової довжини")
+        bad = set(row) - allowed
+        if bad:
+            raise ValueError(f"Недопустимі символи у сітці: {''.join(sorted(bad))}")
 
-    grid = [list(row) for row in raw]
+    grid = bytearray("".join(raw).encode("ascii").translate(TO_CODES))
     slots: List[Slot] = []
     sid = 0
+    # клітинка -> [(id_слота, позиція в слоті)] для обчислення перетинів
+    cell_to_slotpos: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
 
     # Горизонтальні слоти
     for r in range(h):
         c = 0
         while c < w:
-            if grid[r][c] != '#':
+            if raw[r][c] != '#':
                 # початок слота, якщо зліва стіна або край сітки
-                if c == 0 or grid[r][c - 1] == '#':
+                if c == 0 or raw[r][c - 1] == '#':
                     start = c
-                    while c < w and grid[r][c] != '#':
+                    while c < w and raw[r][c] != '#':
                         c += 1
                     length = c - start
                     if length > 1:
-                        slots.append(Slot(sid, [(r, cc) for cc in range(start, c)]))
+                        cells = [(r, cc) for cc in range(start, c)]
+                        slots.append(Slot(sid, cells, array("i", [rr * w + cc for rr, cc in cells])))
+                        for pos, cell in enumerate(cells):
+                            cell_to_slotpos.setdefault(cell, []).append((sid, pos))
                         sid += 1
                     continue
             c += 1
@@ -53,19 +134,29 @@ def parse_grid(raw: List[str]):
     for c in range(w):
         r = 0
         while r < h:
-            if grid[r][c] != '#':
+            if raw[r][c] != '#':
                 # початок слота, якщо зверху стіна або край
-                if r == 0 or grid[r - 1][c] == '#':
+                if r == 0 or raw[r - 1][c] == '#':
                     start = r
-                    while r < h and grid[r][c] != '#':
+                    while r < h and raw[r][c] != '#':
                         r += 1
                     length = r - start
                     if length > 1:
-                        slots.append(Slot(sid, [(rr, c) for rr in range(start, r)]))
+                        cells = [(rr, c) for rr in range(start, r)]
+                        slots.append(Slot(sid, cells, array("i", [rr * w + cc for rr, cc in cells])))
+                        for pos, cell in enumerate(cells):
+                            cell_to_slotpos.setdefault(cell, []).append((sid, pos))
                         sid += 1
                     continue
             r += 1
 
+    # Перетини: клітинка, що належить двом слотам (горизонтальному й вертикальному)
+    for entries in cell_to_slotpos.values():
+        if len(entries) == 2:
+            (sid_a, pos_a), (sid_b, pos_b) = entries
+            slots[sid_a].intersections.append((sid_b, pos_a, pos_b))
+            slots[sid_b].intersections.append((sid_a, pos_b, pos_a))
+
     return grid, slots
 
 
@@ -73,120 +164,507 @@ def slot_length(slot: Slot) -> int:
     return len(slot.cells)
 
 
-def build_domains(slots: List[Slot], dictionary: List[str]) -> Dict[int, List[str]]:
+def slot_lengths(slots: List[Slot]) -> Set[int]:
+    return {slot_length(slot) for slot in slots}
+
+
+def bucket_words(words: Iterable[str], required_lengths: Set[int]) -> Dict[int, List[str]]:
     """
-    Для кожного слота підбираємо слова відповідної довжини.
+    Розкладаємо слова за довжиною за один прохід, лишаючи тільки довжини,
+    що є серед слотів. Слова з символами поза A..Z у сітку не вписати – їх пропускаємо.
     """
     by_len: Dict[int, List[str]] = {}
-    for w in dictionary:
-        w = w.strip()
-        if not w:
-            continue
-        by_len.setdefault(len(w), []).append(w.upper())
+    for w in words:
+        w = w.strip().upper()
+        if len(w) in required_lengths and w.isascii() and w.isalpha():
+            by_len.setdefault(len(w), []).append(w)
+    return by_len
+
 
-    domains: Dict[int, List[str]] = {}
+def build_domains(
+    slots: List[Slot],
+    by_len: Dict[int, List[str]],
+) -> List[Tuple[bytes, ...]]:
+    """
+    Домени слотів (by_len – слова за довжиною, див. bucket_words) без копіювання списків слів:
+    domains[id] – кортеж слів довжини слота, закодованих у коди клітинок (encode_word),
+    щоб пошук порівнював і вписував цілі числа; один спільний на всі слоти цієї довжини.
+    """
+    words_by_len: Dict[int, Tuple[bytes, ...]] = {}
+    domains: List[Tuple[bytes, ...]] = [()] * len(slots)
     for slot in slots:
-        domains[slot.id] = list(by_len.get(slot_length(slot), []))
+        length = slot_length(slot)
+        if length not in words_by_len:
+            words_by_len[length] = tuple(encode_word(word) for word in by_len.get(length, ()))
+        domains[slot.id] = words_by_len[length]
     return domains
 
 
-def is_consistent(word: str, slot: Slot, grid: List[List[str]]) -> bool:
+def build_intersections(slots: List[Slot]) -> Dict[Tuple[int, int], Tuple[int, int]]:
     """
-    Перевіряємо, чи слово сумісне з уже заповненими літерами в сітці.
+    Дуги для AC-3: {(id_a, id_b): (позиція_в_a, позиція_в_b)} для кожної
+    пари слотів, що мають спільну клітинку (в обидва боки), зі Slot.intersections.
     """
-    for ch, (r, c) in zip(word, slot.cells):
-        if grid[r][c] != '.' and grid[r][c] != ch:
-            return False
+    return {
+        (slot.id, other): (pos_self, pos_other)
+        for slot in slots
+        for other, pos_self, pos_other in slot.intersections
+    }
+
+
+def revise(
+    a: int,
+    b: int,
+    alive: List[int],
+    letter_bits: List[List[Dict[int, int]]],
+    intersections: Dict[Tuple[int, int], Tuple[int, int]],
+) -> bool:
+    """
+    Залишаємо в домені a лише слова, для яких у домені b є слово
+    з тією ж літерою на перетині. Повертає True, якщо домен a зменшився.
+    """
+    idx_a, idx_b = intersections[(a, b)]
+
+    # підтримка: літери на перетині, що ще є в домені b -> слова домену a з ними
+    bits_a = letter_bits[a][idx_a]
+    supported = 0
+    for code, mask in letter_bits[b][idx_b].items():
+        if mask & alive[b]:
+            supported |= bits_a.get(code, 0)
+
+    kept = alive[a] & supported
+    if kept == alive[a]:
+        return False
+    alive[a] = kept
     return True
 
 
-def apply_word(word: str, slot: Slot, grid: List[List[str]]):
+def ac3(
+    alive: List[int],
+    letter_bits: List[List[Dict[int, int]]],
+    intersections: Dict[Tuple[int, int], Tuple[int, int]],
+) -> bool:
     """
-    Вписуємо слово в сітку, повертаємо список попередніх значень для відкату.
+    Дугова узгодженість (AC-3) на перетинах слотів.
+    Повертає False, якщо якийсь домен став порожнім (розв’язку немає).
     """
-    prev_state = []
-    for ch, (r, c) in zip(word, slot.cells):
-        prev_state.append((r, c, grid[r][c]))
-        grid[r][c] = ch
-    return prev_state
+    neighbours: List[List[int]] = [[] for _ in alive]
+    for a, b in intersections:
+        neighbours[a].append(b)
+
+    queue = deque(intersections)
+    in_queue = set(intersections)
+    while queue:
+        a, b = queue.popleft()
+        in_queue.discard((a, b))
+        if not revise(a, b, alive, letter_bits, intersections):
+            continue
+        if not alive[a]:
+            return False
+        for c in neighbours[a]:
+            if c != b and (c, a) not in in_queue:
+                queue.append((c, a))
+                in_queue.add((c, a))
+    return True
 
 
-def undo(prev_state, grid: List[List[str]]):
+def build_letter_bits(
+    slots: List[Slot],
+    domains: List[Tuple[bytes, ...]],
+) -> List[List[Dict[int, int]]]:
+    """
+    Бітові індекси доменів: letter_bits[id][i][код літери] – маска слів домену слота,
+    у яких на позиції i стоїть ця літера (біт k відповідає domains[id][k]).
+    Індекс будується раз на довжину; слоти однакової довжини ділять один список.
+    """
+    by_len: Dict[int, List[Dict[int, int]]] = {}
+    for slot in slots:
+        length = slot_length(slot)
+        if length in by_len:
+            continue
+        positions: List[Dict[int, int]] = [{} for _ in range(length)]
+        for k, word in enumerate(domains[slot.id]):
+            bit = 1 << k
+            for i, code in enumerate(word):
+                positions[i][code] = positions[i].get(code, 0) | bit
+        by_len[length] = positions
+    return [by_len[slot_length(slot)] for slot in slots]
+
+
+def consistent_mask(
+    slot: Slot,
+    grid: bytearray,
+    domains: List[Tuple[bytes, ...]],
+    letter_bits: List[List[Dict[int, int]]],
+) -> int:
+    """
+    Маска слів домену, сумісних з уже зафіксованими в сітці літерами
+    (біт k відповідає domains[id][k]).
+    """
+    mask = (1 << len(domains[slot.id])) - 1
+    bits = letter_bits[slot.id]
+    for i, idx in enumerate(slot.cell_idx):
+        code = grid[idx]
+        if code != EMPTY:
+            mask &= bits[i].get(code, 0)
+            if not mask:
+                break
+    return mask
+
+
+def iter_bits(mask: int):
+    """
+    Номери встановлених бітів маски (від молодших до старших).
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def apply_word(
+    word: bytes,
+    slot: Slot,
+    grid: bytearray,
+    assignment: List[Optional[bytes]],
+    live_mask: List[int],
+    letter_bits: List[List[Dict[int, int]]],
+    crossings: List[List[Tuple[int, int, int]]],
+    used: Set[bytes],
+):
+    """
+    Вписуємо слово в сітку, позначаємо його вжитим (used) і звужуємо маски
+    перетинних слотів (forward checking).
+    Повертаємо стан для відкату і False, якщо якийсь слот лишився без слів.
+    """
+    used.add(word)
+    prev_cells = []
+    for idx, code in zip(slot.cell_idx, word):
+        prev_cells.append((idx, grid[idx]))
+        grid[idx] = code
+
+    prev_masks = []
+    ok = True
+    for other, idx_self, idx_other in crossings[slot.id]:
+        if assignment[other] is not None:
+            continue
+        old = live_mask[other]
+        new = old & letter_bits[other][idx_other].get(word[idx_self], 0)
+        if new != old:
+            prev_masks.append((other, old))
+            live_mask[other] = new
+            if not new:
+                ok = False
+                break
+    return (word, prev_cells, prev_masks), ok
+
+
+def undo(prev_state, grid: bytearray, live_mask: List[int], used: Set[bytes]):
     """
-    Відкат змін у сітці.
+    Відкат змін у сітці, масках доменів і множині вжитих слів.
     """
-    for r, c, ch in prev_state:
-        grid[r][c] = ch
+    word, prev_cells, prev_masks = prev_state
+    used.discard(word)
+    for idx, code in prev_cells:
+        grid[idx] = code
+    for sid, mask in prev_masks:
+        live_mask[sid] = mask
 
 
 def select_unassigned_slot(
     slots: List[Slot],
-    assignment: Dict[int, str],
-    domains: Dict[int, List[str]],
-    grid: List[List[str]],
+    assignment: List[Optional[bytes]],
+    live_mask: List[int],
+    degree: List[int],
+    rng: Optional[random.Random] = None,
 ):
     """
     Вибрати наступний слот для присвоєння (MRV – мінімум допустимих значень).
+    Нічиї – на користь слота з більшим степенем (кількістю перетинів),
+    далі випадково (rng) або за порядком слотів.
     """
-    best_slot = None
-    best_count = None
-
-    for slot in slots:
-        if slot.id in assignment:
-            continue
+    free = [slot for slot in slots if assignment[slot.id] is None]
+    if not free:
+        return None
+    if rng is not None:
+        return min(free, key=lambda slot: (live_mask[slot.id].bit_count(), -degree[slot.id], rng.random()))
+    return min(free, key=lambda slot: (live_mask[slot.id].bit_count(), -degree[slot.id]))
 
-        count = 0
-        for w in domains[slot.id]:
-            if is_consistent(w, slot, grid):
-                count += 1
 
-        if best_count is None or count < best_count:
-            best_count = count
-            best_slot = slot
+def mrv_heap_push(heap: list, version: List[int], sid: int, live_mask: List[int], degree: List[int]):
+    """
+    Записати в MRV-купу поточний розмір домену слота; попередні записи
+    цього слота стають застарілими (версія збільшується).
+    """
+    version[sid] += 1
+    heapq.heappush(heap, (live_mask[sid].bit_count(), -degree[sid], sid, version[sid]))
 
-        if best_count == 0:
-            break
 
-    return best_slot, best_count
+def mrv_heap_select(
+    slots: List[Slot],
+    heap: list,
+    version: List[int],
+    assignment: List[Optional[bytes]],
+    live_mask: List[int],
+    degree: List[int],
+) -> Slot:
+    """
+    Те саме, що select_unassigned_slot без rng, але з купи записів
+    (розмір домену, -степінь, id, версія): застарілі записи й записи вже
+    заповнених слотів знімаються з вершини ліниво. Купа має містити хоча б
+    один вільний слот.
+    """
+    if len(heap) > MRV_HEAP_SLACK * len(slots):
+        heap[:] = [
+            (live_mask[sid].bit_count(), -degree[sid], sid, version[sid])
+            for sid in range(len(slots)) if assignment[sid] is None
+        ]
+        heapq.heapify(heap)
+    while True:
+        _, _, sid, ver = heap[0]
+        if ver == version[sid] and assignment[sid] is None:
+            return slots[sid]
+        heapq.heappop(heap)
+
+
+def order_candidates(
+    slot: Slot,
+    words: Tuple[bytes, ...],
+    assignment: List[Optional[bytes]],
+    live_mask: List[int],
+    letter_bits: List[List[Dict[int, int]]],
+    crossings: List[List[Tuple[int, int, int]]],
+    strategy: str = "mrv_lcv",
+    rng: Optional[random.Random] = None,
+) -> List[int]:
+    """
+    Порядок перебору слів слота (номери в words):
+      mrv_lcv – LCV, найменш обмежувальне значення першим: за спаданням добутку
+                розмірів доменів, що лишаться у перетинних слотах;
+      mrv_random – випадковий;  mrv_dict – словниковий;
+      random_restarts – випадковий, де слово з більшою LCV-оцінкою має більше шансів бути раніше.
+    Для LCV-порядків слова, після яких якийсь перетинний слот спорожніє, відкидаються одразу.
+    """
+    if strategy == "mrv_dict":
+        return list(iter_bits(live_mask[slot.id]))
+    if strategy == "mrv_random":
+        order = list(iter_bits(live_mask[slot.id]))
+        rng.shuffle(order)
+        return order
+
+    # Залишок домену перетинного слота залежить лише від літери слова на перетині,
+    # тож рахуємо його раз на (перетин, літеру), а не для кожного слова; слова
+    # з літерою, після якої сусід спорожніє, знімаються з маски кандидатів одразу.
+    candidates = live_mask[slot.id]
+    bits_self = letter_bits[slot.id]
+    lefts = []
+    for other, idx_self, idx_other in crossings[slot.id]:
+        if assignment[other] is not None:
+            continue
+        live_other = live_mask[other]
+        left_by_code: Dict[int, int] = {}
+        supported = 0
+        for code, mask in letter_bits[other][idx_other].items():
+            left = (live_other & mask).bit_count()
+            if left:
+                left_by_code[code] = left
+                supported |= bits_self[idx_self].get(code, 0)
+        candidates &= supported
+        lefts.append((idx_self, left_by_code))
+
+    scored = []
+    for k in iter_bits(candidates):
+        word = words[k]
+        score = 1
+        for idx_self, left_by_code in lefts:
+            score *= left_by_code[word[idx_self]]
+        scored.append((-score, k))
+    if strategy == "random_restarts":
+        # зважена вибірка без повторень: ключ u^(1/вага), вага = 1 + ln(оцінка)
+        scored = [(-rng.random() ** (1.0 / (1.0 + math.log(-neg))), k) for neg, k in scored]
+    scored.sort()
+    return [k for _, k in scored]
 
 
 def backtrack(
     slots: List[Slot],
-    grid: List[List[str]],
-    domains: Dict[int, List[str]],
-    assignment: Dict[int, str],
+    grid: bytearray,
+    domains: List[Tuple[bytes, ...]],
+    assignment: List[Optional[bytes]],
     forbid_reuse: bool,
-) -> bool:
+    live_mask: List[int],
+    letter_bits: List[List[Dict[int, int]]],
+    crossings: List[List[Tuple[int, int, int]]],
+    strategy: str = "mrv_lcv",
+    rng: Optional[random.Random] = None,
+    max_nodes: int = 0,
+) -> Optional[bool]:
     """
-    Пошук у глибину з відкатами (backtracking).
+    Пошук у глибину з відкатами (backtracking) без рекурсії: явний стек кадрів
+    [слот, ітератор кандидатів, стан для відкату поточного слова].
+    strategy – порядок слотів і слів (див. STRATEGIES). Якщо max_nodes > 0 і
+    спроб вписати слово стало більше, стан відкочується і повертається None.
+    Стан пошуку – списки за id слота (assignment[id] is None – слот вільний)
+    і множина used уже вписаних слів, яку ведуть apply_word/undo.
+    Без випадкових нічиїх і від MRV_HEAP_MIN_SLOTS слотів слот вибирається з
+    MRV-купи (mrv_heap_select), яку поповнюють лише слоти, чиї маски змінилися
+    при вписуванні чи відкаті.
     """
-    if len(assignment) == len(slots):
-        return True  # всі слоти заповнені
-
-    slot, count = select_unassigned_slot(slots, assignment, domains, grid)
-    if slot is None or count == 0:
-        return False
-
-    for word in domains[slot.id]:
-        if forbid_reuse and word in assignment.values():
-            continue
-        if not is_consistent(word, slot, grid):
-            continue
-
-        prev_state = apply_word(word, slot, grid)
-        assignment[slot.id] = word
+    degree = [len(c) for c in crossings]
+    tie_rng = rng if strategy == "random_restarts" else None
+    nodes = 0
+    assigned_count = 0
+    used: Set[bytes] = set()
+
+    heap = None
+    if tie_rng is None and len(slots) >= MRV_HEAP_MIN_SLOTS:
+        version = [0] * len(slots)
+        heap = [(live_mask[sid].bit_count(), -degree[sid], sid, 0) for sid in range(len(slots))]
+        heapq.heapify(heap)
+
+    stack: List[list] = []
+    descend = True
+    while True:
+        if descend:
+            if assigned_count == len(slots):
+                return True  # всі слоти заповнені
+            if heap is not None:
+                slot = mrv_heap_select(slots, heap, version, assignment, live_mask, degree)
+            else:
+                slot = select_unassigned_slot(slots, assignment, live_mask, degree, tie_rng)
+            candidates = order_candidates(
+                slot, domains[slot.id], assignment, live_mask, letter_bits, crossings, strategy, rng,
+            )
+            stack.append([slot, iter(candidates), None])
 
-        if backtrack(slots, grid, domains, assignment, forbid_reuse):
-            return True
+        if not stack:
+            return False
+        frame = stack[-1]
+        slot, candidates, prev_state = frame
+        if prev_state is not None:
+            # відкат попереднього кандидата
+            assignment[slot.id] = None
+            assigned_count -= 1
+            undo(prev_state, grid, live_mask, used)
+            frame[2] = None
+            if heap is not None:
+                mrv_heap_push(heap, version, slot.id, live_mask, degree)
+                for sid, _ in prev_state[2]:
+                    mrv_heap_push(heap, version, sid, live_mask, degree)
+
+        descend = False
+        words = domains[slot.id]
+        for k in candidates:
+            word = words[k]
+            if forbid_reuse and word in used:
+                continue
+
+            nodes += 1
+            if max_nodes and nodes > max_nodes:
+                # ліміт вичерпано – відкочуємо все, що вписано
+                for frame_slot, _, frame_state in reversed(stack):
+                    if frame_state is not None:
+                        assignment[frame_slot.id] = None
+                        undo(frame_state, grid, live_mask, used)
+                return None
+
+            assignment[slot.id] = word
+            prev_state, ok = apply_word(word, slot, grid, assignment, live_mask, letter_bits, crossings, used)
+            if ok:
+                frame[2] = prev_state
+                assigned_count += 1
+                if heap is not None:
+                    for sid, _ in prev_state[2]:
+                        mrv_heap_push(heap, version, sid, live_mask, degree)
+                descend = True
+                break
+            assignment[slot.id] = None
+            undo(prev_state, grid, live_mask, used)
+
+        if not descend:
+            stack.pop()
+
+
+def backtrack_restarts(
+    slots: List[Slot],
+    grid: bytearray,
+    domains: List[Tuple[bytes, ...]],
+    assignment: List[Optional[bytes]],
+    forbid_reuse: bool,
+    live_mask: List[int],
+    letter_bits: List[List[Dict[int, int]]],
+    crossings: List[List[Tuple[int, int, int]]],
+    rng: random.Random,
+) -> bool:
+    """
+    Випадкові перезапуски: кожен запуск обмежений кількістю спроб, що
+    подвоюється, тож рано чи пізно пошук стає повним.
+    """
+    budget = RESTART_FIRST_BUDGET
+    while True:
+        result = backtrack(
+            slots, grid, domains, assignment, forbid_reuse, live_mask, letter_bits, crossings,
+            "random_restarts", rng, budget,
+        )
+        if result is not None:
+            return result
+        budget *= 2
 
-        # відкат
-        del assignment[slot.id]
-        undo(prev_state, grid)
 
-    return False
+def solve_with_strategy(
+    raw_grid: List[str],
+    dictionary: Union[List[str], Dict[int, List[str]]],
+    forbid_reuse: bool = False,
+    strategy: str = "mrv_lcv",
+    seed: int = 0,
+):
+    """
+    Розв’язання однією стратегією з STRATEGIES (seed – для випадкових).
+    dictionary – список слів або вже розкладені за довжиною слова
+    (load_dictionary_for_slots). Повертає те саме, що solve_crossword.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Невідома стратегія: {strategy} (доступні: {', '.join(STRATEGIES)})")
+    grid, slots = parse_grid(raw_grid)
+    if not slots:
+        raise ValueError("У сітці немає жодного слота (послідовності довжини ≥ 2)")
+    if not isinstance(dictionary, dict):
+        dictionary = bucket_words(dictionary, slot_lengths(slots))
+    domains = build_domains(slots, dictionary)
+    letter_bits = build_letter_bits(slots, domains)
+    alive = [consistent_mask(slot, grid, domains, letter_bits) for slot in slots]
+    assignment: List[Optional[bytes]] = [None] * len(slots)
+
+    intersections = build_intersections(slots)
+    if not ac3(alive, letter_bits, intersections):
+        return False, render_grid(grid, len(raw_grid[0])), {}, slots
+
+    # живі маски пошуку починаються з того, що пережило AC-3
+    live_mask = alive
+    crossings = [slot.intersections for slot in slots]
+    args = (slots, grid, domains, assignment, forbid_reuse, live_mask, letter_bits, crossings)
+
+    if not all(live_mask):
+        success = False
+    elif strategy == "mrv_lcv":
+        success = backtrack(*args, max_nodes=NUMBA_AFTER_NODES if HAVE_NUMBA else 0)
+        if success is None:
+            # ліміт вичерпано, стан відкочено – продовжує Numba-ядро
+            success = backtrack_numba(*args)
+    elif strategy == "random_restarts":
+        success = backtrack_restarts(*args, random.Random(seed))
+    else:
+        success = backtrack(*args, strategy, random.Random(seed))
+    solved_grid = render_grid(grid, len(raw_grid[0]))
+    words = {sid: decode_word(word) for sid, word in enumerate(assignment) if word is not None}
+    return success, solved_grid, words, slots
 
 
-def solve_crossword(raw_grid: List[str], dictionary: List[str], forbid_reuse: bool = False):
+def solve_crossword(
+    raw_grid: List[str],
+    dictionary: Union[List[str], Dict[int, List[str]]],
+    forbid_reuse: bool = False,
+):
     """
     Повертає:
       success: bool – чи знайдено розв’язок
@@ -194,15 +672,303 @@ def solve_crossword(raw_grid: List[str], dictionary: List[str], forbid_reuse: bo
       assignment: Dict[int, str] – {id_слота: слово}
       slots: список слотів, щоб при бажанні подивитись координати
     """
-    grid, slots = parse_grid(raw_grid)
-    if not slots:
-        raise ValueError("У сітці немає жодного слота (послідовності довжини ≥ 2)")
-    domains = build_domains(slots, dictionary)
-    assignment: Dict[int, str] = {}
+    return solve_with_strategy(raw_grid, dictionary, forbid_reuse)
 
-    success = backtrack(slots, grid, domains, assignment, forbid_reuse)
-    solved_grid = ["".join(row) for row in grid]
-    return success, solved_grid, assignment, slots
+
+def _run_strategy(conn, task):
+    """
+    Процес портфеля: відсилає батькові результат solve_with_strategy або виняток.
+    """
+    try:
+        conn.send(solve_with_strategy(*task))
+    except Exception as e:
+        conn.send(e)
+    conn.close()
+
+
+def solve_portfolio(
+    raw_grid: List[str],
+    dictionary: Union[List[str], Dict[int, List[str]]],
+    forbid_reuse: bool = False,
+    seed: int = 0,
+):
+    """
+    Портфель: усі стратегії з STRATEGIES паралельно в окремих процесах.
+    Кожна стратегія – повний пошук, тож перша відповідь остаточна (розв’язок
+    або доведена його відсутність); решту процесів зупиняємо.
+    Кожен процес має власний канал (Pipe), а не спільну чергу Pool: вбитий
+    посеред роботи процес не лишає після себе зайнятих блокувань.
+    Повертає те саме, що solve_crossword.
+    """
+    processes = []
+    conns = []
+    for i, strategy in enumerate(STRATEGIES):
+        recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+        proc = multiprocessing.Process(
+            target=_run_strategy,
+            args=(send_conn, (raw_grid, dictionary, forbid_reuse, strategy, seed + i)),
+            daemon=True,
+        )
+        proc.start()
+        send_conn.close()
+        processes.append(proc)
+        conns.append(recv_conn)
+
+    try:
+        result = multiprocessing.connection.wait(conns)[0].recv()
+    finally:
+        for proc in processes:
+            proc.terminate()
+        for proc in processes:
+            proc.join()
+        for conn in conns:
+            conn.close()
+
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+# ======================= NUMBA-ЯДРО =======================
+
+if HAVE_NUMBA:
+    _U0 = np.uint64(0)
+    _U1 = np.uint64(1)
+    _M1 = np.uint64(0x5555555555555555)
+    _M2 = np.uint64(0x3333333333333333)
+    _M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+    _H01 = np.uint64(0x0101010101010101)
+
+    @njit(cache=True)
+    def popcount64(x):
+        x = x - ((x >> _U1) & _M1)
+        x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+        x = (x + (x >> np.uint64(4))) & _M4
+        return int((x * _H01) >> np.uint64(56))
+
+    @njit(cache=True)
+    def popcount_row(row):
+        total = 0
+        for b in range(row.shape[0]):
+            total += popcount64(row[b])
+        return total
+
+    @njit(cache=True)
+    def first_set_bit(x):
+        # x != 0
+        return popcount64((x & (~x + _U1)) - _U1)
+
+    @njit(cache=True)
+    def select_mrv(live, assigned, n_cross):
+        # MRV, нічиї – за більшою кількістю перетинів
+        best = -1
+        best_count = -1
+        for sid in range(live.shape[0]):
+            if assigned[sid] >= 0:
+                continue
+            count = popcount_row(live[sid])
+            if best < 0 or count < best_count or (count == best_count and n_cross[sid] > n_cross[best]):
+                best = sid
+                best_count = count
+                if count == 0:
+                    break
+        return best, best_count
+
+    @njit(cache=True)
+    def order_lcv(sid, depth, live, kind, letter_bits, words, cross, n_cross, assigned, order, scores, lefts):
+        # кандидати слота у порядку LCV; order/scores – буфери на кожну глибину.
+        # lefts[j, літера] – скільки слів лишиться j-му сусіду з цією літерою на
+        # перетині: рахується раз на вузол, а не для кожного кандидата.
+        for j in range(n_cross[sid]):
+            other = cross[sid, j, 0]
+            if assigned[other] >= 0:
+                continue
+            for ch in range(lefts.shape[1]):
+                left = 0
+                for bb in range(live.shape[1]):
+                    left += popcount64(live[other, bb] & letter_bits[kind[other], cross[sid, j, 2], ch, bb])
+                lefts[j, ch] = left
+
+        n = 0
+        for b in range(live.shape[1]):
+            bits = live[sid, b]
+            while bits != _U0:
+                k = b * 64 + first_set_bit(bits)
+                bits &= bits - _U1
+                # log добутку розмірів доменів сусідів (без переповнення)
+                score = 0.0
+                alive = True
+                for j in range(n_cross[sid]):
+                    other = cross[sid, j, 0]
+                    if assigned[other] >= 0:
+                        continue
+                    left = lefts[j, words[kind[sid], k, cross[sid, j, 1]]]
+                    if left == 0:
+                        alive = False
+                        break
+                    score += np.log(left)
+                if alive:
+                    order[depth, n] = k
+                    scores[depth, n] = score
+                    n += 1
+        idx = np.argsort(-scores[depth, :n], kind="mergesort")
+        order[depth, :n] = order[depth, :n][idx]
+        return n
+
+    @njit(cache=True)
+    def apply_and_propagate(sid, k, depth, live, kind, letter_bits, words, cross, n_cross, saved, assigned):
+        for j in range(n_cross[sid]):
+            saved[depth, j, :] = live[cross[sid, j, 0], :]
+        for j in range(n_cross[sid]):
+            other = cross[sid, j, 0]
+            if assigned[other] >= 0:
+                continue
+            ch = words[kind[sid], k, cross[sid, j, 1]]
+            empty = True
+            for b in range(live.shape[1]):
+                v = live[other, b] & letter_bits[kind[other], cross[sid, j, 2], ch, b]
+                live[other, b] = v
+                if v != _U0:
+                    empty = False
+            if empty:
+                return False
+        return True
+
+    @njit(cache=True)
+    def undo_nb(sid, depth, live, cross, n_cross, saved):
+        for j in range(n_cross[sid]):
+            live[cross[sid, j, 0], :] = saved[depth, j, :]
+
+    @njit(cache=True)
+    def backtrack_nb(
+        live, kind, letter_bits, words, cross, n_cross, saved, assigned, word_gid, used, forbid_reuse,
+        order, scores, lefts,
+    ):
+        # явний стек по глибині: слот, наступна позиція в order[depth], кількість кандидатів
+        n_slots = live.shape[0]
+        stack_sid = np.empty(n_slots, dtype=np.int32)
+        stack_pos = np.empty(n_slots, dtype=np.int32)
+        stack_n = np.empty(n_slots, dtype=np.int32)
+
+        depth = 0
+        descend = True
+        while depth >= 0:
+            if descend:
+                if depth == n_slots:
+                    return True
+                sid, count = select_mrv(live, assigned, n_cross)
+                stack_sid[depth] = sid
+                stack_pos[depth] = 0
+                stack_n[depth] = 0
+                if count > 0:
+                    stack_n[depth] = order_lcv(
+                        sid, depth, live, kind, letter_bits, words, cross, n_cross, assigned, order, scores, lefts
+                    )
+
+            sid = stack_sid[depth]
+            if assigned[sid] >= 0:
+                # відкат попереднього кандидата
+                undo_nb(sid, depth, live, cross, n_cross, saved)
+                used[word_gid[kind[sid], assigned[sid]]] = False
+                assigned[sid] = -1
+
+            descend = False
+            while stack_pos[depth] < stack_n[depth]:
+                k = order[depth, stack_pos[depth]]
+                stack_pos[depth] += 1
+                gid = word_gid[kind[sid], k]
+                if forbid_reuse and used[gid]:
+                    continue
+
+                assigned[sid] = k
+                used[gid] = forbid_reuse
+                if apply_and_propagate(
+                    sid, k, depth, live, kind, letter_bits, words, cross, n_cross, saved, assigned
+                ):
+                    descend = True
+                    break
+                undo_nb(sid, depth, live, cross, n_cross, saved)
+                used[gid] = False
+                assigned[sid] = -1
+
+            if descend:
+                depth += 1
+            else:
+                depth -= 1
+        return False
+
+
+def backtrack_numba(
+    slots: List[Slot],
+    grid: bytearray,
+    domains: List[Tuple[bytes, ...]],
+    assignment: List[Optional[bytes]],
+    forbid_reuse: bool,
+    live_mask: List[int],
+    letter_bits: List[List[Dict[int, int]]],
+    crossings: List[List[Tuple[int, int, int]]],
+) -> bool:
+    """
+    Те саме, що backtrack, але пошук виконує Numba-ядро над масивами uint64:
+    маски доменів розбиті на блоки по 64 слова, а індекси літер і слова
+    зберігаються раз на довжину (kind[id] – номер довжини слота).
+    """
+    n_slots = len(slots)
+    words_by_len = {slot_length(slot): domains[slot.id] for slot in slots}
+    lengths = sorted(words_by_len)
+    kind_of = {length: i for i, length in enumerate(lengths)}
+    max_domain = max(1, max(len(words) for words in words_by_len.values()))
+    max_len = max(lengths)
+    max_cross = max(1, max(len(c) for c in crossings))
+    blocks = (max_domain + 63) // 64
+
+    live = np.zeros((n_slots, blocks), dtype=np.uint64)
+    kind = np.zeros(n_slots, dtype=np.int32)
+    bits_arr = np.zeros((len(lengths), max_len, len(LETTERS), blocks), dtype=np.uint64)
+    words_arr = np.zeros((len(lengths), max_domain, max_len), dtype=np.int32)
+    word_gid = np.zeros((len(lengths), max_domain), dtype=np.int32)
+    cross = np.zeros((n_slots, max_cross, 3), dtype=np.int32)
+    n_cross = np.zeros(n_slots, dtype=np.int32)
+
+    full = (1 << 64) - 1
+    gids: Dict[bytes, int] = {}
+    bits_of_len = {slot_length(slot): letter_bits[slot.id] for slot in slots}
+    for length, words in words_by_len.items():
+        t = kind_of[length]
+        for k, w in enumerate(words):
+            words_arr[t, k, :length] = [code - 2 for code in w]
+            word_gid[t, k] = gids.setdefault(w, len(gids))
+        for i, by_letter in enumerate(bits_of_len[length]):
+            for code, mask in by_letter.items():
+                for b in range(blocks):
+                    bits_arr[t, i, code - 2, b] = (mask >> (64 * b)) & full
+    for slot in slots:
+        sid = slot.id
+        kind[sid] = kind_of[slot_length(slot)]
+        for b in range(blocks):
+            live[sid, b] = (live_mask[sid] >> (64 * b)) & full
+        n_cross[sid] = len(crossings[sid])
+        for j, entry in enumerate(crossings[sid]):
+            cross[sid, j] = entry
+
+    saved = np.zeros((n_slots, max_cross, blocks), dtype=np.uint64)
+    assigned = np.full(n_slots, -1, dtype=np.int32)
+    used = np.zeros(max(1, len(gids)), dtype=np.bool_)
+    order = np.zeros((n_slots, max_domain), dtype=np.int32)
+    scores = np.zeros((n_slots, max_domain), dtype=np.float64)
+    lefts = np.zeros((max_cross, len(LETTERS)), dtype=np.int64)
+
+    if not backtrack_nb(
+        live, kind, bits_arr, words_arr, cross, n_cross, saved, assigned, word_gid, used, forbid_reuse,
+        order, scores, lefts,
+    ):
+        return False
+
+    for slot in slots:
+        word = domains[slot.id][assigned[slot.id]]
+        assignment[slot.id] = word
+        for idx, code in zip(slot.cell_idx, word):
+            grid[idx] = code
+    return True
 
 # ======================= ЧИТАННЯ З ФАЙЛІВ =======================
 
@@ -219,28 +985,35 @@ def read_grid_from_file(path: str) -> List[str]:
     return lines
 
 
-def read_dict_from_file(path: str) -> List[str]:
+def load_dictionary_for_slots(path: str, required_lengths: Set[int]) -> Dict[int, List[str]]:
     """
     dict.txt:
       по одному слову в рядок.
+    Файл читається потоково, слова одразу розкладаються за довжиною,
+    і зберігаються лише довжини з required_lengths (див. slot_lengths).
     """
     with open(path, "r", encoding="utf-8") as f:
-        words = [line.strip() for line in f if line.strip()]
-    return words
+        return bucket_words(f, required_lengths)
 
 # ======================= CLI-РЕЖИМ =======================
 
-def run_cli(grid_path: str = "grid.txt", dict_path: str = "dict.txt", forbid_reuse: bool = False):
+def run_cli(
+    grid_path: str = "grid.txt",
+    dict_path: str = "dict.txt",
+    forbid_reuse: bool = False,
+    portfolio: bool = False,
+):
     print(f"Читаю сітку з: {grid_path}")
     print(f"Читаю словник з: {dict_path}")
     raw_grid = read_grid_from_file(grid_path)
-    dictionary = read_dict_from_file(dict_path)
+    dictionary = load_dictionary_for_slots(dict_path, slot_lengths(parse_grid(raw_grid)[1]))
 
     print("\nПочаткова сітка:")
     for row in raw_grid:
         print(row)
 
-    success, solved, assignment, slots = solve_crossword(raw_grid, dictionary, forbid_reuse)
+    solve = solve_portfolio if portfolio else solve_crossword
+    success, solved, assignment, slots = solve(raw_grid, dictionary, forbid_reuse)
 
     if success:
         print("\nЗнайдено розв’язок:")
@@ -257,6 +1030,20 @@ def run_cli(grid_path: str = "grid.txt", dict_path: str = "dict.txt", forbid_reu
 
 # ======================= GUI НА TKINTER =======================
 
+CELL_SIZE = 32  # сторона клітинки на полотні, px
+
+
+def cell_style(ch: str, letter_fg: str) -> Tuple[str, str, str]:
+    """
+    (текст, фон, колір тексту) для клітинки сітки.
+    """
+    if ch == "#":
+        return " ", "black", "white"
+    if ch == ".":
+        return " ", "white", "black"
+    return ch, "white", letter_fg
+
+
 class CrosswordGUI:
     def __init__(self, master, grid_path="grid.txt", dict_path="dict.txt"):
         self.master = master
@@ -268,7 +1055,9 @@ class CrosswordGUI:
         # завантажуємо дані
         try:
             self.raw_grid = read_grid_from_file(self.grid_path)
-            self.dictionary = read_dict_from_file(self.dict_path)
+            self.dictionary = load_dictionary_for_slots(
+                self.dict_path, slot_lengths(parse_grid(self.raw_grid)[1])
+            )
         except Exception as e:
             messagebox.showerror("Помилка читання файлів", str(e))
             self.raw_grid = [
@@ -282,7 +1071,12 @@ class CrosswordGUI:
 
         self.forbid_reuse_var = tk.BooleanVar(value=False)
 
-        self.cells_widgets: List[List[tk.Label]] = []
+        # Уся сітка – одне полотно: прямокутник і текст на клітинку.
+        # prev_rendered – останній намальований стиль клітинок, щоб
+        # перемальовувати лише змінені.
+        self.rect_ids: List[List[int]] = []
+        self.text_ids: List[List[int]] = []
+        self.prev_rendered: List[List[Tuple[str, str, str]]] = []
 
         control_frame = tk.Frame(master)
         control_frame.pack(side=tk.TOP, pady=5)
@@ -303,57 +1097,52 @@ class CrosswordGUI:
         self.status_label = tk.Label(master, text="", fg="blue")
         self.status_label.pack(side=tk.TOP, pady=5)
 
-        self.grid_frame = tk.Frame(master)
-        self.grid_frame.pack(side=tk.TOP, pady=5)
+        self.canvas = tk.Canvas(master, highlightthickness=0)
+        self.canvas.pack(side=tk.TOP, pady=5)
 
         self.draw_grid(self.raw_grid)
 
     def clear_grid_widgets(self):
-        for row in self.cells_widgets:
-            for lbl in row:
-                lbl.destroy()
-        self.cells_widgets = []
+        self.canvas.delete("all")
+        self.rect_ids = []
+        self.text_ids = []
+        self.prev_rendered = []
 
     def draw_grid(self, raw_grid: List[str]):
         self.clear_grid_widgets()
+        width = max((len(row) for row in raw_grid), default=0)
+        self.canvas.config(width=width * CELL_SIZE + 2, height=len(raw_grid) * CELL_SIZE + 2)
         for r, row in enumerate(raw_grid):
-            row_widgets = []
+            rect_row = []
+            text_row = []
+            style_row = []
             for c, ch in enumerate(row):
-                bg = "white"
-                fg = "black"
-                text = ch
-                if ch == "#":
-                    bg = "black"
-                    fg = "white"
-                    text = " "
-                elif ch == ".":
-                    text = " "
-
-                lbl = tk.Label(
-                    self.grid_frame,
-                    text=text,
-                    width=2,
-                    height=1,
-                    borderwidth=1,
-                    relief="solid",
-                    bg=bg,
-                    fg=fg,
-                    font=("Consolas", 14),
-                )
-                lbl.grid(row=r, column=c, padx=1, pady=1)
-                row_widgets.append(lbl)
-            self.cells_widgets.append(row_widgets)
+                style = cell_style(ch, "black")
+                text, bg, fg = style
+                x = c * CELL_SIZE + 1
+                y = r * CELL_SIZE + 1
+                rect_row.append(self.canvas.create_rectangle(
+                    x, y, x + CELL_SIZE, y + CELL_SIZE, fill=bg, outline="gray",
+                ))
+                text_row.append(self.canvas.create_text(
+                    x + CELL_SIZE // 2, y + CELL_SIZE // 2, text=text, fill=fg, font=("Consolas", 14),
+                ))
+                style_row.append(style)
+            self.rect_ids.append(rect_row)
+            self.text_ids.append(text_row)
+            self.prev_rendered.append(style_row)
 
     def update_grid_display(self, solved_grid: List[str]):
         for r, row in enumerate(solved_grid):
+            prev_row = self.prev_rendered[r]
             for c, ch in enumerate(row):
-                lbl = self.cells_widgets[r][c]
-                if ch == "#":
-                    lbl.config(text=" ", bg="black", fg="white")
-                elif ch == ".":
-                    lbl.config(text=" ", bg="white", fg="black")
-                else:
-                    lbl.config(text=ch, bg="white", fg="blue")
+                style = cell_style(ch, "blue")
+                if style == prev_row[c]:
+                    continue
+                text, bg, fg = style
+                self.canvas.itemconfigure(self.rect_ids[r][c], fill=bg)
+                self.canvas.itemconfigure(self.text_ids[r][c], text=text, fill=fg)
+                prev_row[c] = style
 
     def on_solve(self):
         try:
@@ -372,7 +1161,9 @@ class CrosswordGUI:
     def on_reload(self):
         try:
             self.raw_grid = read_grid_from_file(self.grid_path)
-            self.dictionary = read_dict_from_file(self.dict_path)
+            self.dictionary = load_dictionary_for_slots(
+                self.dict_path, slot_lengths(parse_grid(self.raw_grid)[1])
+            )
             self.draw_grid(self.raw_grid)
             self.status_label.config(text="Файли перечитані ✅", fg="blue")
         except Exception as e:
@@ -391,6 +1182,7 @@ if __name__ == "__main__":
     #   python crossword_csp.py             -> CLI, grid.txt + dict.txt, можна редагувати кодом forbid_reuse
     #   python crossword_csp.py gui         -> GUI, grid.txt + dict.txt
     #   python crossword_csp.py cli no-reuse -> CLI, заборонено повтор слів
+    #   python crossword_csp.py cli portfolio -> CLI, паралельний портфель стратегій (можна з no-reuse)
     args = sys.argv[1:]
 
     if not args:
@@ -400,7 +1192,9 @@ if __name__ == "__main__":
         run_gui()
     else:
         forbid_reuse = False
+        portfolio = False
         if len(args) >= 1 and args[0].lower() == "cli":
-            if len(args) >= 2 and args[1].lower() == "no-reuse":
-                forbid_reuse = True
-        run_cli(forbid_reuse=forbid_reuse)
+            options = [arg.lower() for arg in args[1:]]
+            forbid_reuse = "no-reuse" in options
+            portfolio = "portfolio" in options
+        run_cli(forbid_reuse=forbid_reuse, portfolio=portfolio)